@@ -1,18 +1,70 @@
 import psutil
 import time
-import matplotlib.pyplot as plt
+import numpy as np
 import argparse
+import os
 import sys
+import queue
+import collections
+import functools
+import threading
+import socket
 import logging
-import speedtest
+import http.client
+import matplotlib
+
+# Sem servidor gráfico (ex.: SSH/CI no Linux) usa o backend Agg, que só gera imagens
+if sys.platform.startswith('linux') and not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY')):
+    matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
 
 # Configuração do logging
 logging.basicConfig(
-    level=logging.DEBUG,  # Alterado para DEBUG para mais detalhes
+    level=logging.INFO,  # Use -v/--verbose para ver as mensagens de DEBUG
     format="%(asctime)s - %(levelname)s - %(message)s",
     datefmt="%H:%M:%S"
 )
 
+# Tabelas de sockets do kernel (Linux); cada linha após o cabeçalho é um socket
+_PROC_TCP = ('/proc/net/tcp', '/proc/net/tcp6')
+_PROC_UDP = ('/proc/net/udp', '/proc/net/udp6')
+_HAS_PROC_NET = os.path.exists('/proc/net/tcp')
+
+# Contadores de bytes por interface (Linux)
+_PROC_DEV = '/proc/net/dev'
+_HAS_PROC_DEV = os.path.exists(_PROC_DEV)
+
+# Estado operacional de cada interface (Linux)
+_SYS_NET = '/sys/class/net'
+_HAS_SYS_NET = os.path.isdir(_SYS_NET)
+_UP_STATES = ('up', 'unknown', 'dormant')
+
+# Contadores cumulativos de protocolos (Linux), incluindo mensagens ICMP
+_PROC_SNMP = '/proc/net/snmp'
+_HAS_ICMP = os.access(_PROC_SNMP, os.R_OK)
+
+# Teste de velocidade: download de um objeto de tamanho conhecido
+SPEEDTEST_HOST = 'speed.cloudflare.com'
+SPEEDTEST_DOWNLOAD_BYTES = 10_000_000
+SPEEDTEST_UPLOAD_BYTES = 2_000_000
+SPEEDTEST_TIMEOUT = 15  # segundos
+
+# Validade (s) da lista de interfaces mantida por get_available_interfaces
+INTERFACES_TTL = 5.0
+_last_refresh = float('-inf')
+
+# Número máximo de rótulos de valor desenhados no gráfico
+MAX_ANNOTATIONS = 20
+
+# Estilo de cada série no gráfico: (rótulo, marcador, estilo de linha)
+SERIES_STYLES = (
+    ('Largura de Banda', 'o', '-'),
+    ('Conexões TCP', 'x', '--'),
+    ('Conexões UDP', '^', '-.'),
+    ('Pacotes ICMP', 's', ':'),
+)
+
 def send_alert(message):
     """
     Exibe uma mensagem de alerta via logging e emite um beep.
@@ -20,226 +72,789 @@ def send_alert(message):
     logging.warning(message)
     print('\a')  # Beep (pode não funcionar em todos os sistemas)
 
+@functools.lru_cache(maxsize=1)
+def _list_interfaces():
+    """
+    Lê do sistema os nomes das interfaces, excluindo a 'lo' (loopback).
+    """
+    return tuple(name for name in psutil.net_io_counters(pernic=True) if name != 'lo')
+
 def get_available_interfaces():
     """
     Retorna uma lista com os nomes de todas as interfaces disponíveis.
     Excluindo a interface 'lo' (loopback) e outras não-relevantes.
+    O resultado é reaproveitado por INTERFACES_TTL segundos; use
+    get_available_interfaces.cache_clear() para forçar uma nova leitura.
     """
-    interfaces = list(psutil.net_io_counters(pernic=True).keys())
-    if 'lo' in interfaces:
-        interfaces.remove('lo')  # Remove a interface de loopback
-    return interfaces
+    global _last_refresh
+    now = time.monotonic()
+    if now - _last_refresh > INTERFACES_TTL:
+        _list_interfaces.cache_clear()
+        _last_refresh = now
+    return list(_list_interfaces())
+
+get_available_interfaces.cache_clear = _list_interfaces.cache_clear
 
 def auto_select_interface():
     """
     Seleciona automaticamente a primeira interface de rede ativa, excluindo 'lo'.
     """
-    available = get_available_interfaces()
-    for interface in available:
-        stats = psutil.net_io_counters(pernic=True).get(interface)
-        if stats and (stats.bytes_sent > 0 or stats.bytes_recv > 0):
-            logging.info(f"Interface '{interface}' está ativa.")
+    counters = psutil.net_io_counters(pernic=True)
+    for interface, stats in counters.items():
+        if interface == 'lo':
+            continue
+        if stats.bytes_sent > 0 or stats.bytes_recv > 0:
+            logging.info("Interface '%s' está ativa.", interface)
             return interface
     send_alert("Nenhuma interface ativa encontrada.")
     return None
 
-def check_internet_speed():
+def _count_lines(path):
     """
-    Verifica a velocidade da internet (download e upload) e retorna os valores.
+    Retorna o número de entradas de uma tabela de /proc/net (ignora o cabeçalho).
     """
-    st = speedtest.Speedtest()
-
     try:
-        # Força a seleção do melhor servidor
-        st.get_best_server()
+        with open(path, 'rb') as f:
+            return max(f.read().count(b'\n') - 1, 0)
+    except OSError:
+        return 0  # Ex.: tcp6/udp6 ausentes quando o IPv6 está desabilitado
 
-        # Faz o teste de download e upload
-        download_speed = st.download() / 1_000_000  # em Mbps
-        upload_speed = st.upload() / 1_000_000  # em Mbps
+def count_connections():
+    """
+    Retorna a contagem de sockets (TCP, UDP) do sistema.
+    No Linux lê diretamente o procfs; nos demais sistemas recorre ao psutil.
+    """
+    if _HAS_PROC_NET:
+        tcp_count = sum(_count_lines(path) for path in _PROC_TCP)
+        udp_count = sum(_count_lines(path) for path in _PROC_UDP)
+        return tcp_count, udp_count
+
+    # Uma única varredura 'inet' separada por tipo de socket
+    tcp_count = udp_count = 0
+    for conn in psutil.net_connections(kind='inet'):
+        if conn.type == socket.SOCK_STREAM:
+            tcp_count += 1
+        elif conn.type == socket.SOCK_DGRAM:
+            udp_count += 1
+    return tcp_count, udp_count
+
+def _read_proc_dev_counters(dev_file, interface):
+    """
+    Lê (bytes_sent, bytes_recv) da interface diretamente de /proc/net/dev,
+    reaproveitando o arquivo já aberto. Retorna None se a interface não existir.
+    """
+    dev_file.seek(0)
+    prefix = interface + ':'
+    for line in dev_file:
+        line = line.lstrip()
+        if line.startswith(prefix):
+            # Campos após 'iface:': 0 = bytes recebidos, 8 = bytes enviados
+            fields = line[len(prefix):].split()
+            return int(fields[8]), int(fields[0])
+    return None
 
-        # Calcula o ping
-        ping = st.results.ping
+def _read_psutil_counters(interface):
+    """
+    Lê (bytes_sent, bytes_recv) da interface via psutil, ou None se ela não existir.
+    """
+    stats = psutil.net_io_counters(pernic=True).get(interface)
+    if stats is None:
+        return None
+    return stats.bytes_sent, stats.bytes_recv
 
-        logging.info(f"Velocidade de Download: {download_speed:.2f} Mbps")
-        logging.info(f"Velocidade de Upload: {upload_speed:.2f} Mbps")
-        logging.info(f"Ping: {ping} ms")
+def _is_up(interface):
+    """
+    Indica se a interface está ativa (link operacional). No Linux lê apenas /sys/class/net/<iface>/operstate;
+    nos demais sistemas recorre ao psutil. Retorna None se a interface não existir.
+    """
+    if _HAS_SYS_NET:
+        try:
+            with open(f"{_SYS_NET}/{interface}/operstate") as f:
+                state = f.read().strip()
+        except OSError:
+            return None
+        # 'unknown' é comum em interfaces sem detecção de link (ex.: lo, tun).
+        # Diferente do isup do psutil (IFF_UP), o operstate também exige portadora:
+        # uma placa ativada mas sem cabo conta como inativa
+        return state in _UP_STATES
+
+    stats = psutil.net_if_stats().get(interface)
+    return None if stats is None else stats.isup
+
+def _read_icmp_counters():
+    """
+    Retorna o total acumulado de mensagens ICMP (recebidas + enviadas) lido
+    de /proc/net/snmp, ou None se o arquivo não estiver disponível.
+    """
+    try:
+        with open(_PROC_SNMP) as f:
+            icmp_lines = [line.split() for line in f if line.startswith('Icmp:')]
+    except OSError:
+        return None
+    if len(icmp_lines) < 2:
+        return None
+
+    # A primeira linha 'Icmp:' traz os nomes dos campos e a segunda os valores
+    header, values = icmp_lines[0], icmp_lines[1]
+    return int(values[header.index('InMsgs')]) + int(values[header.index('OutMsgs')])
+
+def _timed_request(conn, method, path, body=None):
+    """
+    Executa a requisição HTTP na conexão já aberta, lê toda a resposta em blocos
+    e retorna (bytes recebidos, tempo decorrido em segundos).
+    Levanta http.client.HTTPException se o servidor não responder com status 200.
+    """
+    start = time.monotonic()
+    conn.request(method, path, body=body, headers={'User-Agent': 'rede.py'})
+    received = 0
+    with conn.getresponse() as response:
+        if response.status != 200:
+            raise http.client.HTTPException(f"resposta HTTP {response.status} {response.reason}")
+        while chunk := response.read(64 * 1024):
+            received += len(chunk)
+    return received, time.monotonic() - start
+
+def check_internet_speed(results=None, measure_upload=False):
+    """
+    Verifica a velocidade da internet (download e, opcionalmente, upload) e retorna os valores.
+    Baixa um objeto de tamanho conhecido do SPEEDTEST_HOST e mede o tempo da transferência.
+    Todas as requisições usam a mesma conexão HTTPS, então DNS, TCP e TLS ficam
+    fora das medições.
+
+    :param results: Fila opcional (queue.Queue) onde é colocado o par (resultado,
+        instante de término em time.monotonic()), permitindo executar o teste em
+        uma thread separada.
+    :param measure_upload: Se True, também mede o upload (o valor é None caso contrário).
+    """
+    conn = http.client.HTTPSConnection(SPEEDTEST_HOST, timeout=SPEEDTEST_TIMEOUT)
+    try:
+        # Abre a conexão (DNS + TCP + TLS) com uma requisição sem corpo, fora da medição
+        _timed_request(conn, 'GET', '/__down?bytes=0')
+
+        # Ping aproximado: uma requisição sem corpo na conexão já aberta
+        _, elapsed = _timed_request(conn, 'GET', '/__down?bytes=0')
+        ping = elapsed * 1000  # em ms
+
+        # Teste de download
+        received, elapsed = _timed_request(conn, 'GET', f'/__down?bytes={SPEEDTEST_DOWNLOAD_BYTES}')
+        if received < SPEEDTEST_DOWNLOAD_BYTES:
+            raise http.client.HTTPException(
+                f"download incompleto ({received} de {SPEEDTEST_DOWNLOAD_BYTES} bytes)")
+        download_speed = (received * 8) / (elapsed * 1_000_000)  # em Mbps
+
+        # Teste de upload
+        upload_speed = None
+        if measure_upload:
+            _, elapsed = _timed_request(conn, 'POST', '/__up', body=bytes(SPEEDTEST_UPLOAD_BYTES))
+            upload_speed = (SPEEDTEST_UPLOAD_BYTES * 8) / (elapsed * 1_000_000)  # em Mbps
+
+        logging.info("Velocidade de Download: %.2f Mbps", download_speed)
+        if upload_speed is not None:
+            logging.info("Velocidade de Upload: %.2f Mbps", upload_speed)
+        logging.info("Ping: %.0f ms", ping)
 
         # Verifica se a velocidade está preocupante
         if download_speed < 5:  # 5 Mbps como limite para download
             send_alert("Velocidade de download preocupante! (<5 Mbps)")
-        if upload_speed < 1:  # 1 Mbps como limite para upload
+        if upload_speed is not None and upload_speed < 1:  # 1 Mbps como limite para upload
             send_alert("Velocidade de upload preocupante! (<1 Mbps)")
 
-        return download_speed, upload_speed, ping
+        result = (download_speed, upload_speed, ping)
+
+    except (OSError, http.client.HTTPException) as e:  # Falhas de rede, timeouts e respostas truncadas/inválidas
+        send_alert(f"Erro ao executar o teste de velocidade: {e}")
+        result = (None, None, None)
+    finally:
+        conn.close()
+
+    if results is not None:
+        results.put((result, time.monotonic()))
+    return result
+
+def _empty_series():
+    """
+    Retorna a tupla de séries vazias usada quando o monitoramento não pode começar.
+    """
+    return tuple(np.empty(0) for _ in range(5))
+
+def _collected(series, idx, window):
+    """
+    Retorna as séries com apenas as medições já coletadas.
+    """
+    if window:
+        return series  # Os deques só contêm medições reais
+    return tuple(values[:idx] for values in series)
 
-    except speedtest.ConfigRetrievalError as e:
-        send_alert(f"Erro ao recuperar a configuração do servidor: {e}")
-        return None, None, None
+def _traffic_series(series, idx, window, base):
+    """
+    Converte as séries brutas do monitoramento (tempos de leitura, bytes enviados,
+    bytes recebidos, TCP, UDP e, se houver, ICMP) nas séries retornadas por
+    monitor_network_traffic, calculando a largura de banda (Mbits/sec) de uma vez.
 
-def monitor_network_traffic(interface, duration=30, interval=1, force_monitor=False):
+    :param base: (tempo, bytes enviados, bytes recebidos) da leitura anterior à
+        primeira medição das séries.
     """
-    Monitora o tráfego de rede e retorna listas de tempos e largura de banda (em Mbits/sec).
+    collected = [np.asarray(values) for values in _collected(series, idx, window)]
+    times, sent, recv = collected[:3]
+    base_time, base_sent, base_recv = base
+
+    dt = np.diff(times, prepend=base_time)
+    total_bytes = np.diff(sent, prepend=base_sent) + np.diff(recv, prepend=base_recv)
+    bw_values = np.zeros(len(times))
+    np.divide(total_bytes * 8.0, dt * 1024 * 1024, out=bw_values, where=dt > 0)
+
+    icmp_values = collected[5] if len(collected) > 5 else np.empty(0)
+    return np.round(times, 1), bw_values, collected[3], collected[4], icmp_values
+
+def monitor_network_traffic(interface, duration=30, interval=1, force_monitor=False, on_sample=None,
+                            window=None, barrier=None):
+    """
+    Monitora o tráfego de rede e retorna arrays de tempos e largura de banda (em Mbits/sec).
     Agora, também coleta dados específicos para protocolos TCP, UDP, ICMP.
 
     :param interface: Nome da interface de rede a ser monitorada.
     :param duration: Duração total do monitoramento (em segundos).
     :param interval: Intervalo entre as medições (em segundos).
     :param force_monitor: Se True, ignora a verificação do status da interface.
-    :return: (time_values, bw_values, tcp_values, udp_values, icmp_values)
+    :param on_sample: Função opcional chamada após cada medição com as séries
+        coletadas até o momento (usada pelo modo --live).
+    :param window: Se informado, mantém apenas as últimas `window` medições
+        (deques de tamanho fixo), com uso de memória constante.
+    :param barrier: threading.Barrier opcional aguardada antes de cada leitura,
+        para alinhar as medições de várias interfaces (ver monitor_interfaces).
+    :return: (time_values, bw_values, tcp_values, udp_values, icmp_values);
+        icmp_values fica vazio quando o sistema não expõe contadores ICMP.
     """
-    time_values, bw_values, tcp_values, udp_values, icmp_values = [], [], [], [], []
-
     if interval <= 0:
         send_alert("O intervalo deve ser maior que zero.")
-        return [], [], [], [], []
+        return _empty_series()
 
     stats = psutil.net_io_counters(pernic=True)
     if interface not in stats:
         send_alert(f"Interface '{interface}' não encontrada.")
         logging.info("Interfaces disponíveis: %s", get_available_interfaces())
-        return [], [], [], [], []
+        return _empty_series()
 
-    # Dados iniciais
-    initial_stats = stats[interface]
-    initial_bytes_sent = initial_stats.bytes_sent
-    initial_bytes_recv = initial_stats.bytes_recv
+    # Verifica o status da interface antes de começar, a menos que forçado
+    is_up = _is_up(interface)
+    if is_up is None:
+        send_alert(f"Não foi possível obter o status da interface '{interface}'.")
+        logging.info("Interfaces disponíveis: %s", get_available_interfaces())
+        return _empty_series()
+    if not is_up and not force_monitor:
+        send_alert(f"A interface '{interface}' está inativa.")
+        return _empty_series()
+
+    # Durante o ciclo só os contadores brutos são guardados; a largura de banda
+    # é calculada depois, de forma vetorizada, por _traffic_series.
+    # A primeira medição ocorre após um intervalo completo desde a leitura inicial
+    n_samples = max(int(duration / interval + 1e-9), 1)
+    n_series = 6 if _HAS_ICMP else 5  # Sem contadores ICMP a série nem é coletada
+    if window:
+        # Janela deslizante: as medições mais antigas são descartadas automaticamente
+        series = tuple(collections.deque(maxlen=window) for _ in range(n_series))
+    else:
+        # Arrays pré-alocados para todas as medições previstas
+        series = (
+            np.empty(n_samples, dtype=np.float64),  # Tempos de leitura (s)
+            np.empty(n_samples, dtype=np.int64),  # Bytes enviados
+            np.empty(n_samples, dtype=np.int64),  # Bytes recebidos
+            np.empty(n_samples, dtype=np.int64),  # tcp_values
+            np.empty(n_samples, dtype=np.int64),  # udp_values
+            np.empty(n_samples, dtype=np.int64),  # icmp_values
+        )[:n_series]
+    idx = 0
+
+    # No Linux mantém /proc/net/dev aberto e lê só a linha da interface a cada ciclo
+    dev_file = open(_PROC_DEV) if _HAS_PROC_DEV else None
+    if dev_file is not None:
+        read_counters = functools.partial(_read_proc_dev_counters, dev_file)
+    else:
+        read_counters = _read_psutil_counters
 
-    start_time = time.time()
-    logging.info("Monitoramento iniciado na interface '%s'.", interface)
+    # Referências locais para as funções usadas a cada ciclo (evita buscas globais/atributos)
+    _monotonic = time.monotonic
+    _sleep = time.sleep
+    _is_up_now = _is_up
+    _count_connections = count_connections
+    _read_icmp = _read_icmp_counters
+    _debug = logging.debug
 
+    base = (0.0, 0, 0)  # Substituída pela leitura inicial logo abaixo
     try:
-        while (elapsed := time.time() - start_time) < duration:
+        # Dados iniciais, lidos junto com o instante de referência
+        initial_counters = read_counters(interface)
+        if initial_counters is None:
+            send_alert(f"Interface '{interface}' não encontrada.")
+            return _empty_series()
+        initial_icmp = _read_icmp_counters() if _HAS_ICMP else None
+        start_time = _monotonic()
+        base = (0.0, *initial_counters)
+        logging.info("Monitoramento iniciado na interface '%s'.", interface)
+
+        while idx < n_samples:
+            # Dorme até o prazo absoluto da próxima medição, sem acumular atraso
+            sleep_for = start_time + (idx + 1) * interval - _monotonic()
+            if sleep_for > 0:
+                _sleep(sleep_for)
+            else:
+                logging.warning("Medição atrasada em %.3f s em relação ao intervalo.", -sleep_for)
+
+            if barrier is not None:
+                barrier.wait()  # Lê ao mesmo tempo que as demais interfaces
+
             # Verifica o status da interface, a menos que forçado
-            interface_stats = psutil.net_if_stats().get(interface)
-            if interface_stats is None:
-                send_alert(f"Não foi possível obter o status da interface '{interface}'.")
-                logging.info("Interfaces disponíveis: %s", get_available_interfaces())
-                break
-            if not interface_stats.isup and not force_monitor:
+            if not force_monitor and _is_up_now(interface) is False:
                 send_alert(f"A conexão na interface '{interface}' foi interrompida.")
                 break
 
-            time_values.append(round(elapsed, 1))
-
-            current_stats = psutil.net_io_counters(pernic=True).get(interface)
-            if current_stats is None:
+            current_counters = read_counters(interface)
+            if current_counters is None:
                 send_alert(f"Interface '{interface}' não encontrada durante a execução.")
                 logging.info("Interfaces disponíveis: %s", get_available_interfaces())
                 break
 
-            current_bytes_sent = current_stats.bytes_sent
-            current_bytes_recv = current_stats.bytes_recv
+            current_bytes_sent, current_bytes_recv = current_counters
 
-            # Exibe as contagens de bytes a cada intervalo para depuração
-            logging.debug(f"Contadores atuais: Enviados={current_bytes_sent}, Recebidos={current_bytes_recv}")
+            # Momento real da leitura (o sleep não é exato), usado no cálculo da banda
+            read_time = _monotonic() - start_time
 
-            # Calcula a largura de banda (Mbits/sec) para envio e recebimento
-            sent_bw = ((current_bytes_sent - initial_bytes_sent) * 8) / (interval * 1024 * 1024)
-            recv_bw = ((current_bytes_recv - initial_bytes_recv) * 8) / (interval * 1024 * 1024)
-            total_bw = sent_bw + recv_bw
-            bw_values.append(total_bw)
+            # Exibe as contagens de bytes a cada intervalo para depuração
+            _debug("Contadores atuais: Enviados=%d, Recebidos=%d", current_bytes_sent, current_bytes_recv)
 
             # Coleta dados específicos de protocolos (TCP, UDP, ICMP)
-            tcp_stats = psutil.net_connections(kind='tcp')
-            udp_stats = psutil.net_connections(kind='udp')
-            icmp_stats = psutil.net_if_stats()  # Não diretamente, mas podemos monitorar pacotes ICMP
+            tcp_count, udp_count = _count_connections()
+
+            # Pacotes ICMP trocados desde a última medição
+            current_icmp = _read_icmp() if _HAS_ICMP else None
+            if current_icmp is not None and initial_icmp is not None:
+                icmp_count = current_icmp - initial_icmp
+            else:
+                icmp_count = 0
+
+            # Atualiza o contador para a próxima iteração
+            initial_icmp = current_icmp
+
+            _debug("Conexões TCP: %d, UDP: %d, ICMP: %d", tcp_count, udp_count, icmp_count)
+
+            # Sem ICMP, zip() descarta o último valor, pois há só 5 séries
+            sample = (read_time, current_bytes_sent, current_bytes_recv, tcp_count, udp_count, icmp_count)
+            if window:
+                if len(series[0]) == window:
+                    # A medição descartada passa a ser a referência da primeira mantida
+                    base = (series[0][0], series[1][0], series[2][0])
+                for values, value in zip(series, sample):
+                    values.append(value)
+            else:
+                for values, value in zip(series, sample):
+                    values[idx] = value
+            idx += 1
+
+            if on_sample is not None:
+                on_sample(*_traffic_series(series, idx, window, base))
+    except KeyboardInterrupt:
+        send_alert("Monitorização interrompida pelo usuário.")
+    except threading.BrokenBarrierError:
+        logging.info("Monitoramento da interface '%s' interrompido.", interface)
+    except Exception as e:
+        send_alert(f"Ocorreu um erro: {e}")
+    finally:
+        if dev_file is not None:
+            dev_file.close()
 
-            tcp_values.append(len(tcp_stats))  # Contagem de conexões TCP
-            udp_values.append(len(udp_stats))  # Contagem de conexões UDP
-            icmp_values.append(sum(1 for _ in icmp_stats.values() if 'icmp' in _))  # Exemplo simplificado para ICMP
+    return _traffic_series(series, idx, window, base)
 
-            # Atualiza os contadores para a próxima iteração
-            initial_bytes_sent = current_bytes_sent
-            initial_bytes_recv = current_bytes_recv
+def monitor_interfaces(interfaces, duration=30, interval=1, force_monitor=False, window=None):
+    """
+    Monitora várias interfaces em paralelo, com uma thread por interface.
+    As leituras de cada ciclo são sincronizadas por uma threading.Barrier, então
+    as séries ficam alinhadas no tempo. Interfaces inexistentes ou inativas são
+    descartadas antes do início; se uma interface parar durante a execução, as
+    demais continuam sendo monitoradas.
+
+    :param interfaces: Lista com os nomes das interfaces.
+    :return: Dicionário {interface: (time_values, bw_values, tcp_values, udp_values, icmp_values)}.
+    """
+    # Interfaces inexistentes ou inativas ficam de fora para não interromper as demais
+    counters = psutil.net_io_counters(pernic=True)
+    valid = []
+    for interface in interfaces:
+        if interface not in counters:
+            send_alert(f"Interface '{interface}' não encontrada.")
+        elif not force_monitor and not _is_up(interface):
+            send_alert(f"A interface '{interface}' está inativa.")
+        else:
+            valid.append(interface)
+    if not valid:
+        return {interface: _empty_series() for interface in interfaces}
+
+    barrier = threading.Barrier(len(valid))
+    results = {}
+    remaining = [len(valid)]  # Threads ainda monitorando
+    remaining_lock = threading.Lock()
+
+    def worker(interface):
+        try:
+            results[interface] = monitor_network_traffic(
+                interface, duration=duration, interval=interval, force_monitor=force_monitor,
+                window=window, barrier=barrier)
+        except Exception as e:
+            send_alert(f"Ocorreu um erro na interface '{interface}': {e}")
+        finally:
+            # Sempre sai da contagem, mesmo com erro, para não travar as demais
+            with remaining_lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                barrier.abort()  # Última interface: libera quem ainda aguarda
+
+        if last:
+            return
+
+        # Continua participando da barreira para que as demais interfaces sigam em frente
+        try:
+            while True:
+                barrier.wait()
+        except threading.BrokenBarrierError:
+            pass
 
-            logging.debug(f"Largura de banda (Mbits/sec): Enviado={sent_bw:.6f}, Recebido={recv_bw:.6f}, Total={total_bw:.6f}")
-            logging.debug(f"Conexões TCP: {len(tcp_stats)}, UDP: {len(udp_stats)}, ICMP: {icmp_values[-1]}")
+    threads = [threading.Thread(target=worker, args=(interface,), name=f"monitor-{interface}")
+               for interface in valid]
+    for thread in threads:
+        thread.start()
 
-            time.sleep(interval)
+    try:
+        for thread in threads:
+            thread.join()
     except KeyboardInterrupt:
         send_alert("Monitorização interrompida pelo usuário.")
-    except Exception as e:
-        send_alert(f"Ocorreu um erro: {e}")
+        barrier.abort()
+        for thread in threads:
+            thread.join()
 
-    return time_values, bw_values, tcp_values, udp_values, icmp_values
+    return {interface: results.get(interface, _empty_series()) for interface in interfaces}
 
-def plot_network_traffic(time_values, bw_values, tcp_values, udp_values, icmp_values, save_path=None):
+def plot_network_traffic(time_values, bw_values, tcp_values, udp_values, icmp_values, save_path=None,
+                         annotate_points=False, speed=None, speed_span=None):
     """
     Gera e exibe o gráfico da largura de banda ao longo do tempo.
     Adicionando visualização para TCP, UDP e ICMP.
 
-    :param time_values: Lista de tempos (s).
-    :param bw_values: Lista de largura de banda (Mbits/sec).
-    :param tcp_values: Lista de contagem de conexões TCP.
-    :param udp_values: Lista de contagem de conexões UDP.
-    :param icmp_values: Lista de pacotes ICMP (aproximado).
-    :param save_path: Se informado, salva o gráfico no caminho especificado.
-    """
-    plt.figure(figsize=(10, 6))
-    plt.plot(time_values, bw_values, marker='o', linestyle='-', label='Largura de Banda')
-    plt.plot(time_values, tcp_values, marker='x', linestyle='--', label='Conexões TCP')
-    plt.plot(time_values, udp_values, marker='^', linestyle='-.', label='Conexões UDP')
-    plt.plot(time_values, icmp_values, marker='s', linestyle=':', label='Pacotes ICMP')
-
-    # Adiciona valores no gráfico
-    for x, y in zip(time_values, bw_values):
-        plt.text(x, y, f"{y:.2f}", fontsize=8, ha='center')
-
-    plt.xlabel("Tempo (s)")
-    plt.ylabel("Métrica")
-    plt.title("Monitoramento de Tráfego de Rede")
-    plt.grid(True)
-    plt.legend()
-    plt.tight_layout()
-
+    :param time_values: Array de tempos (s).
+    :param bw_values: Array de largura de banda (Mbits/sec).
+    :param tcp_values: Array de contagem de conexões TCP.
+    :param udp_values: Array de contagem de conexões UDP.
+    :param icmp_values: Array de pacotes ICMP por intervalo (omitido do gráfico se vazio).
+    :param save_path: Se informado, salva o gráfico no caminho especificado
+        em vez de exibi-lo em uma janela.
+    :param annotate_points: Se True, escreve o valor da largura de banda em até
+        MAX_ANNOTATIONS pontos do gráfico.
+    :param speed: Resultado opcional de check_internet_speed (download, upload, ping),
+        exibido no título do gráfico.
+    :param speed_span: (início, fim) opcional, em segundos, do teste de velocidade;
+        o trecho é destacado, pois o tráfego do próprio teste aparece na largura de banda.
+    """
+    fig, ax = plt.subplots(figsize=(10, 6))
+    _draw_traffic(ax, time_values, bw_values, tcp_values, udp_values, icmp_values, annotate_points,
+                  speed_span)
+    ax.set_title(_speed_title(speed))
+    fig.tight_layout()
+    _show_or_save(save_path)
+
+def plot_multi_interface_traffic(results, save_path=None, annotate_points=False, speed=None,
+                                 speed_span=None):
+    """
+    Gera um gráfico com um painel por interface, compartilhando o eixo do tempo.
+
+    :param results: Dicionário {interface: séries}, como retornado por monitor_interfaces.
+    :param save_path: Se informado, salva o gráfico no caminho especificado
+        em vez de exibi-lo em uma janela.
+    :param annotate_points: Se True, anota valores de largura de banda em cada painel.
+    :param speed: Resultado opcional de check_internet_speed, exibido no título.
+    :param speed_span: (início, fim) opcional do teste de velocidade, destacado em cada painel.
+    """
+    fig, axes = plt.subplots(len(results), 1, sharex=True, squeeze=False,
+                             figsize=(10, 4 * len(results)))
+    for ax, (interface, series) in zip(axes[:, 0], results.items()):
+        _draw_traffic(ax, *series, annotate_points, speed_span)
+        ax.set_title(f"Interface '{interface}'")
+    fig.suptitle(_speed_title(speed))
+    fig.tight_layout()
+    _show_or_save(save_path)
+
+def _draw_traffic(ax, time_values, bw_values, tcp_values, udp_values, icmp_values, annotate_points=False,
+                  speed_span=None):
+    """
+    Desenha as séries de uma interface nos eixos informados.
+    """
+    # Todas as séries em uma única chamada, compartilhando o eixo x
+    columns = [bw_values, tcp_values, udp_values]
+    if len(icmp_values):
+        columns.append(icmp_values)
+    series = np.column_stack(columns)
+    lines = ax.plot(time_values, series)
+    for line, (label, marker, linestyle) in zip(lines, SERIES_STYLES):
+        line.set(marker=marker, linestyle=linestyle, label=label)
+
+    # Adiciona valores no gráfico (amostrados, para não criar um texto por ponto)
+    if annotate_points:
+        stride = max(1, len(bw_values) // MAX_ANNOTATIONS)
+        for x, y in zip(time_values[::stride], bw_values[::stride]):
+            ax.text(x, y, f"{y:.2f}", fontsize=8, ha='center')
+
+    ax.set_xlabel("Tempo (s)")
+    ax.set_ylabel("Métrica")
+    ax.grid(True)
+    # Destaca o período do teste de velocidade, cujo tráfego se soma ao medido
+    if speed_span is not None and len(time_values):
+        start, end = speed_span
+        ax.axvspan(start, end, color='gray', alpha=0.2, label='Teste de velocidade')
+
+    ax.legend()
+
+def _speed_title(speed):
+    """
+    Monta o título do gráfico, incluindo o resultado do teste de velocidade se disponível.
+    """
+    title = "Monitoramento de Tráfego de Rede"
+    if speed and speed[0] is not None:
+        download_speed, upload_speed, ping = speed
+        title += f"\nDownload: {download_speed:.2f} Mbps"
+        if upload_speed is not None:
+            title += f" | Upload: {upload_speed:.2f} Mbps"
+        title += f" | Ping: {ping:.0f} ms"
+    return title
+
+def _show_or_save(save_path):
+    """
+    Salva a figura atual no caminho informado ou, se não houver, exibe-a em uma janela.
+    """
     if save_path:
         try:
             plt.savefig(save_path)
             logging.info("Gráfico salvo em %s", save_path)
         except Exception as e:
             send_alert(f"Erro ao salvar o gráfico: {e}")
-    plt.show()
+    else:
+        plt.show()
+
+def _interface_path(path, interface):
+    """
+    Acrescenta o nome da interface ao arquivo de saída (ex.: dados.csv -> dados_eth0.csv).
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}_{interface}{ext}"
+
+def _speed_test_mask(time_values, speed_span, interval):
+    """
+    Indica quais medições cobrem algum trecho do teste de velocidade, cujo
+    tráfego se soma ao da interface naquele intervalo.
+    """
+    start, end = speed_span
+    # Cada medição cobre o intervalo desde a leitura anterior até o seu tempo. As leituras
+    # seguem prazos fixos, então a anterior à primeira (a inicial ou a descartada pela
+    # janela deslizante) ocorreu um intervalo antes
+    previous = np.concatenate((time_values[:1] - interval, time_values[:-1]))
+    return (time_values >= start) & (previous <= end)
+
+def _export_columns(time_values, bw_values, tcp_values, udp_values, icmp_values, speed_span=None,
+                    interval=1):
+    """
+    Retorna as séries nomeadas para exportação (a coluna 'icmp' só é incluída se houver dados).
+    Com speed_span, a coluna 'speedtest' marca com 1 as medições afetadas pelo teste de velocidade.
+    """
+    columns = {'t': time_values, 'bw': bw_values, 'tcp': tcp_values, 'udp': udp_values}
+    if len(icmp_values):
+        columns['icmp'] = icmp_values
+    if speed_span is not None:
+        columns['speedtest'] = _speed_test_mask(time_values, speed_span, interval).astype(np.int64)
+    return columns
+
+def export_csv(path, time_values, bw_values, tcp_values, udp_values, icmp_values, speed_span=None,
+               interval=1):
+    """
+    Salva as medições em um arquivo CSV (t, bw, tcp, udp, icmp, speedtest), gravado de uma só vez.
+    """
+    columns = _export_columns(time_values, bw_values, tcp_values, udp_values, icmp_values, speed_span,
+                              interval)
+    formats = {'t': '%.1f', 'bw': '%.6f'}
+    try:
+        np.savetxt(path, np.column_stack(list(columns.values())), delimiter=',',
+                   header=','.join(columns), comments='', fmt=[formats.get(name, '%d') for name in columns])
+        logging.info("Dados salvos em %s", path)
+    except Exception as e:
+        send_alert(f"Erro ao salvar o CSV: {e}")
+
+def export_parquet(path, time_values, bw_values, tcp_values, udp_values, icmp_values, speed_span=None,
+                   interval=1):
+    """
+    Salva as medições em um arquivo Parquet. Requer a biblioteca opcional `pyarrow`.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        send_alert("A exportação em Parquet requer a biblioteca 'pyarrow'.")
+        return
+
+    columns = _export_columns(time_values, bw_values, tcp_values, udp_values, icmp_values, speed_span,
+                              interval)
+    try:
+        pq.write_table(pa.table(columns), path, use_dictionary=True)
+        logging.info("Dados salvos em %s", path)
+    except Exception as e:
+        send_alert(f"Erro ao salvar o Parquet: {e}")
+
+def create_live_plot():
+    """
+    Cria a figura do modo ao vivo, com uma linha vazia para cada série.
+    As linhas são reaproveitadas a cada medição por update_live_plot.
+    """
+    plt.ion()
+    fig, ax = plt.subplots(figsize=(10, 6))
+    lines = [ax.plot([], [], marker=marker, linestyle=linestyle, label=label)[0]
+             for label, marker, linestyle in (SERIES_STYLES if _HAS_ICMP else SERIES_STYLES[:-1])]
+
+    ax.set_xlabel("Tempo (s)")
+    ax.set_ylabel("Métrica")
+    ax.set_title("Monitoramento de Tráfego de Rede (ao vivo)")
+    ax.grid(True)
+    ax.legend()
+    fig.tight_layout()
+    plt.show(block=False)
+    return fig, ax, lines
+
+def update_live_plot(fig, ax, lines, time_values, *series):
+    """
+    Atualiza os dados das linhas já existentes e redesenha a figura, sem recriar artistas.
+    """
+    for line, values in zip(lines, series):
+        line.set_data(time_values, values)
+    ax.relim()
+    ax.autoscale_view()
+    fig.canvas.draw_idle()
+    fig.canvas.flush_events()
 
 def main():
     parser = argparse.ArgumentParser(description="Monitoramento de tráfego de rede")
-    parser.add_argument("-i", "--interface", type=str, help="Nome da interface de rede a ser monitorada")
+    parser.add_argument("-i", "--interface", type=str, help="Nome da interface de rede a ser monitorada (várias separadas por vírgula, ex: eth0,wlan0)")
     parser.add_argument("-d", "--duration", type=int, default=30, help="Duração do monitoramento (segundos)")
     parser.add_argument("-t", "--interval", type=int, default=1, help="Intervalo entre medições (segundos)")
     parser.add_argument("-s", "--save", type=str, help="Caminho para salvar o gráfico (ex: grafico.png)")
     parser.add_argument("-f", "--force", action="store_true", help="Força o monitoramento mesmo se a interface estiver inativa")
+    parser.add_argument("--csv", type=str, help="Caminho para salvar as medições em CSV (ex: dados.csv)")
+    parser.add_argument("--parquet", type=str, help="Caminho para salvar as medições em Parquet (requer pyarrow)")
+    parser.add_argument("-a", "--annotate", action="store_true", help="Exibe os valores de largura de banda sobre alguns pontos do gráfico")
+    parser.add_argument("--live", action="store_true", help="Atualiza o gráfico a cada medição durante o monitoramento")
+    parser.add_argument("-w", "--window", type=int, help="Mantém apenas as últimas N medições (janela deslizante, memória constante)")
+    parser.add_argument("-u", "--upload", action="store_true", help="Também mede a velocidade de upload no teste de velocidade (o teste roda durante o monitoramento e seu tráfego é destacado no gráfico e na coluna 'speedtest' das exportações)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Exibe mensagens de depuração (DEBUG)")
     parser.add_argument("--list", action="store_true", help="Lista todas as interfaces de rede disponíveis")
 
     args = parser.parse_args()
 
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
     if args.list:
         print("Interfaces disponíveis:")
         for iface in get_available_interfaces():
             print("-", iface)
         sys.exit(0)
 
+    if args.window is not None and args.window <= 0:
+        send_alert("A janela deve ser maior que zero.")
+        sys.exit(1)
+
+    # Só salvar em arquivo não precisa de janela: evita inicializar o backend gráfico
+    if args.save and not args.live:
+        plt.switch_backend('Agg')
+
     # Seleção automática da interface ativa
-    interface = args.interface if args.interface else auto_select_interface()
+    if args.interface:
+        interfaces = [name.strip() for name in args.interface.split(',') if name.strip()]
+    else:
+        interfaces = [auto_select_interface()]
 
-    if not interface:
+    if not interfaces or not interfaces[0]:
         send_alert("Nenhuma interface de rede ativa encontrada no sistema.")
         sys.exit(1)
 
-    logging.info(f"Iniciando monitoramento na interface '{interface}' por {args.duration} segundos.")
+    if len(interfaces) > 1 and args.live:
+        send_alert("O modo --live suporta apenas uma interface; o gráfico será exibido ao final.")
+        args.live = False
+
+    logging.info("Iniciando monitoramento na(s) interface(s) %s por %d segundos.",
+                 ", ".join(f"'{name}'" for name in interfaces), args.duration)
     
-    # Verifica a velocidade da internet
-    check_internet_speed()
-
-    time_values, bw_values, tcp_values, udp_values, icmp_values = monitor_network_traffic(
-        interface=interface,
-        duration=args.duration,
-        interval=args.interval,
-        force_monitor=args.force
-    )
-
-    if time_values and bw_values:
-        plot_network_traffic(time_values, bw_values, tcp_values, udp_values, icmp_values, save_path=args.save)
+    # Verifica a velocidade da internet em paralelo, sem atrasar o início do monitoramento.
+    # O tráfego do teste passa pela interface monitorada, então o trecho é marcado no resultado.
+    speed_started = time.monotonic()
+    speed_results = queue.Queue()
+    speed_thread = threading.Thread(target=check_internet_speed, args=(speed_results, args.upload),
+                                    daemon=True)
+    speed_thread.start()
+
+    monitor_started = time.monotonic()
+    if len(interfaces) > 1:
+        results = monitor_interfaces(
+            interfaces,
+            duration=args.duration,
+            interval=args.interval,
+            force_monitor=args.force,
+            window=args.window
+        )
+    else:
+        on_sample = None
+        if args.live:
+            fig, ax, lines = create_live_plot()
+            on_sample = functools.partial(update_live_plot, fig, ax, lines)
+
+        results = {interfaces[0]: monitor_network_traffic(
+            interface=interfaces[0],
+            duration=args.duration,
+            interval=args.interval,
+            force_monitor=args.force,
+            on_sample=on_sample,
+            window=args.window
+        )}
+
+        if args.live:
+            # O gráfico final é gerado normalmente a seguir
+            plt.ioff()
+            plt.close(fig)
+
+    # O período do teste só é marcado quando ele terminou com sucesso (houve transferência)
+    speed_span = None
+    try:
+        speed, speed_finished = speed_results.get_nowait()
+    except queue.Empty:
+        logging.info("Teste de velocidade ainda em andamento; o gráfico será gerado sem ele.")
+        speed = None
     else:
+        if speed[0] is not None:
+            speed_span = (max(speed_started - monitor_started, 0.0), speed_finished - monitor_started)
+
+    # Descarta as interfaces sem nenhuma medição
+    results = {name: series for name, series in results.items() if len(series[0]) and len(series[1])}
+    if not results:
         send_alert("Erro ao capturar dados de tráfego de rede.")
+        return
+
+    for name, series in results.items():
+        if args.csv:
+            export_csv(_interface_path(args.csv, name) if len(interfaces) > 1 else args.csv, *series,
+                       speed_span=speed_span, interval=args.interval)
+        if args.parquet:
+            export_parquet(_interface_path(args.parquet, name) if len(interfaces) > 1 else args.parquet, *series,
+                           speed_span=speed_span, interval=args.interval)
+
+    if len(interfaces) > 1:
+        plot_multi_interface_traffic(results, save_path=args.save, annotate_points=args.annotate, speed=speed,
+                                     speed_span=speed_span)
+    else:
+        plot_network_traffic(*results[interfaces[0]], save_path=args.save,
+                             annotate_points=args.annotate, speed=speed, speed_span=speed_span)
 
 if __name__ == "__main__":
     main()